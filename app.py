@@ -1,16 +1,38 @@
 """
 UKP Kickball Roster Manager - Flask Backend
 """
-from flask import Flask, jsonify, request, send_from_directory, session
-from functools import wraps
+from flask import Flask, g, jsonify, make_response, request, send_from_directory, session
+from flask.json.provider import DefaultJSONProvider
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
 import sqlite3
 import hashlib
+import hmac
+import orjson
 import os
+import queue
+import shutil
+import time
 import uuid
 from datetime import datetime, timedelta
+from pathlib import Path
 from werkzeug.utils import secure_filename
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson (int keys allowed, keys sorted like Flask's default)"""
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__, static_folder='static', static_url_path='/static')
+app.json = OrjsonProvider(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'ukp-kickball-secret-key-change-in-production')
 
 # Database setup
@@ -26,6 +48,15 @@ else:
     LOGO_FOLDER = "data/logos"
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+# Bump whenever the schema setup in init_db changes, so existing databases re-run it
+SCHEMA_VERSION = 2
+# Changes with the code, so ETags from before a deploy that reshapes a response never match
+APP_VERSION = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()[:12]
+VERSIONED_TABLES = ('main_roster', 'substitutes', 'games', 'game_player_status', 'lineup_positions')
+# Per-game tables cleared when a game is deleted
+GAME_DATA_TABLES = ('lineup_positions', 'game_player_status', 'published_lineup', 'published_player_order')
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+LOGO_MAX_AGE = 365 * 24 * 60 * 60
 
 # Positions definition
 POSITIONS = [
@@ -41,21 +72,191 @@ POSITION_ABBREVIATIONS = {
     "Right Field": "RF", "Out": "Out"
 }
 
+# Static part of every lineup payload, serialized once (without the enclosing braces)
+POSITIONS_JSON = orjson.dumps({'positions': POSITIONS, 'abbreviations': POSITION_ABBREVIATIONS}).decode()[1:-1]
+
+
+# Published snapshots are only ever looked up by these keys, so they double as
+# clustered primary keys and the tables skip the separate rowid B-tree
+PUBLISHED_LINEUP_TABLE = '''
+    CREATE TABLE IF NOT EXISTS published_lineup (
+        game_id INTEGER NOT NULL,
+        inning INTEGER NOT NULL CHECK(inning BETWEEN 1 AND 7),
+        position TEXT NOT NULL,
+        player_name TEXT NOT NULL,
+        PRIMARY KEY (game_id, inning, player_name),
+        FOREIGN KEY (game_id) REFERENCES games(id)
+    ) WITHOUT ROWID
+'''
+
+PUBLISHED_PLAYER_ORDER_TABLE = '''
+    CREATE TABLE IF NOT EXISTS published_player_order (
+        game_id INTEGER NOT NULL,
+        player_name TEXT NOT NULL,
+        kicking_order INTEGER,
+        PRIMARY KEY (game_id, player_name),
+        FOREIGN KEY (game_id) REFERENCES games(id)
+    ) WITHOUT ROWID
+'''
+
+# Statements that sync a game's snapshot in place: drop rows that left the lineup,
+# upsert the rest. On a re-publish only the rows that actually changed are written.
+SYNC_PUBLISHED_LINEUP = (
+    '''DELETE FROM published_lineup WHERE game_id = :game_id AND NOT EXISTS (
+        SELECT 1 FROM lineup_positions lp
+        WHERE lp.game_id = published_lineup.game_id AND lp.inning = published_lineup.inning
+        AND lp.player_name = published_lineup.player_name)''',
+    '''INSERT INTO published_lineup (game_id, inning, position, player_name)
+        SELECT game_id, inning, position, player_name FROM lineup_positions
+        WHERE game_id = :game_id AND player_name IS NOT NULL
+        ON CONFLICT(game_id, inning, player_name) DO UPDATE SET position = excluded.position
+        WHERE position != excluded.position''',
+    '''DELETE FROM published_player_order WHERE game_id = :game_id AND player_name NOT IN (
+        SELECT player_name FROM game_player_status WHERE game_id = :game_id AND status = 'IN')''',
+    '''INSERT INTO published_player_order (game_id, player_name, kicking_order)
+        SELECT game_id, player_name, kicking_order FROM game_player_status
+        WHERE game_id = :game_id AND status = 'IN'
+        ON CONFLICT(game_id, player_name) DO UPDATE SET kicking_order = excluded.kicking_order
+        WHERE kicking_order IS NOT excluded.kicking_order''',
+)
+
+# Set or clear one player's position for one inning of a game
+SET_LINEUP_POSITION = '''INSERT INTO lineup_positions (game_id, inning, position, player_name)
+    VALUES (:game_id, :inning, :position, :player)
+    ON CONFLICT(game_id, player_name, inning) DO UPDATE SET position = excluded.position'''
+CLEAR_LINEUP_POSITION = '''DELETE FROM lineup_positions
+    WHERE game_id = :game_id AND inning = :inning AND player_name = :player'''
+
+# Set a player's game status; players coming IN go to the end of the kicking order
+SET_PLAYER_STATUS = '''INSERT INTO game_player_status (game_id, player_name, status, is_substitute, kicking_order)
+    VALUES (:game_id, :player_name, :status, :is_sub,
+            CASE WHEN :status = 'IN' THEN (
+                SELECT COALESCE(MAX(kicking_order), 0) + 1 FROM game_player_status
+                WHERE game_id = :game_id AND status = 'IN') END)
+    ON CONFLICT(game_id, player_name) DO UPDATE SET
+    status = excluded.status, is_substitute = excluded.is_substitute,
+    kicking_order = excluded.kicking_order'''
+
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def get_db():
-    """Get database connection"""
-    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
+def valid_lineup_change(change):
+    """Check one {player, inning, position} edit from a batched lineup update"""
+    return (isinstance(change, dict)
+            and isinstance(change.get('player'), str) and change['player'] != ''
+            and type(change.get('inning')) is int and 1 <= change['inning'] <= 7
+            and isinstance(change.get('position') or '', str))
+
+
+# Removes replaced/deleted logo files off the request thread
+_file_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def remove_logo_file(filename):
+    """Delete a logo file in the background; a file that is already gone is fine"""
+    _file_executor.submit(Path(LOGO_FOLDER, filename).unlink, missing_ok=True)
+
+
+def lineup_body(payload):
+    """Serialize a lineup payload, appending the precomputed positions/abbreviations"""
+    body = app.json.dumps(payload)
+    return f"{body[:-1]},{POSITIONS_JSON}}}\n"
+
+
+def group_lineup(rows):
+    """Group (inning, position, player_name) rows into {inning: {player: position}},
+    counting each player's sit-outs in the same pass"""
+    lineup = {}
+    sitOutCounts = Counter()
+    for inning, position, name in rows:
+        if inning not in lineup:
+            lineup[inning] = {}
+        lineup[inning][name] = position
+        if position == 'Out':
+            sitOutCounts[name] += 1
+    return lineup, sitOutCounts
+
+
+def lineup_response(payload):
+    """JSON response for a lineup payload"""
+    return app.response_class(lineup_body(payload), mimetype='application/json')
+
+
+def connect_db():
+    """Open a new database connection"""
+    # Connections are long-lived (see get_db), so a larger statement cache keeps every query prepared
+    conn = sqlite3.connect(DB_NAME, check_same_thread=False, cached_statements=256)
     conn.row_factory = sqlite3.Row
+    # Per-connection tuning; journal_mode=WAL is persistent and set once in init_db
+    conn.executescript('''
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-20000;
+        PRAGMA mmap_size=268435456;
+    ''')
+    return conn
+
+
+# Idle connections, checked out per request and returned on teardown. Unlike a
+# thread-local this also reuses connections when every request gets a fresh thread
+_db_pool = queue.SimpleQueue()
+
+
+def get_db():
+    """Get the request's database connection, reusing a pooled one when available"""
+    conn = g.get('db')
+    if conn is None:
+        try:
+            conn = _db_pool.get_nowait()
+        except queue.Empty:
+            conn = connect_db()
+        g.db = conn
     return conn
 
 
+@app.teardown_appcontext
+def release_db(exception):
+    """Roll back anything a request left uncommitted and return the connection to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        if conn.in_transaction:
+            conn.rollback()
+        _db_pool.put(conn)
+
+
 def init_db():
     """Initialize the database with required tables"""
-    conn = get_db()
+    conn = connect_db()
+    c = conn.cursor()
+    
+    # WAL lets readers proceed during writes; the setting persists in the database file
+    c.execute('PRAGMA journal_mode=WAL')
+    
+    # Run all schema setup as one transaction, so workers starting together take turns
+    # instead of racing each other through the migrations
+    c.execute('BEGIN IMMEDIATE')
+    
+    try:
+        # A database already at this schema version skips the setup entirely. The version
+        # is only stamped if every step succeeded; a failure rolls the whole setup back
+        c.execute('PRAGMA user_version')
+        if c.fetchone()[0] < SCHEMA_VERSION:
+            create_tables(conn)
+            migrate_db(conn)
+            create_indexes(conn)
+            c.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def create_tables(conn):
+    """Create tables, views and change counters (inside init_db's transaction)"""
     c = conn.cursor()
     
     # Users table
@@ -63,7 +264,8 @@ def init_db():
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL
+            password_hash TEXT NOT NULL,
+            password_salt TEXT
         )
     ''')
     
@@ -127,96 +329,167 @@ def init_db():
     ''')
     
     # Published lineup snapshot
+    c.execute(PUBLISHED_LINEUP_TABLE)
+    
+    # Published player order snapshot
+    c.execute(PUBLISHED_PLAYER_ORDER_TABLE)
+    
+    # Every player's gender in one place; substitutes come last so they win on duplicate names
     c.execute('''
-        CREATE TABLE IF NOT EXISTS published_lineup (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            game_id INTEGER NOT NULL,
-            inning INTEGER NOT NULL CHECK(inning BETWEEN 1 AND 7),
-            position TEXT NOT NULL,
-            player_name TEXT,
-            FOREIGN KEY (game_id) REFERENCES games(id)
-        )
+        CREATE VIEW IF NOT EXISTS player_genders AS
+        SELECT player_name, is_female FROM main_roster
+        UNION ALL
+        SELECT player_name, is_female FROM substitutes
     ''')
     
-    # Published player order snapshot
+    # Change counters for the ETags on read-mostly endpoints, bumped by triggers
     c.execute('''
-        CREATE TABLE IF NOT EXISTS published_player_order (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            game_id INTEGER NOT NULL,
-            player_name TEXT NOT NULL,
-            kicking_order INTEGER,
-            FOREIGN KEY (game_id) REFERENCES games(id)
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
         )
     ''')
-    
-    conn.commit()
-    conn.close()
-    migrate_db()
-
-
-def migrate_db():
-    """Migrate database schema"""
-    conn = get_db()
+    # Random per-database token, so ETags issued against another database file (a reset
+    # volume, a restored backup) never match this one's counters
+    c.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('db_token', abs(random()))")
+    for table in VERSIONED_TABLES:
+        c.execute('INSERT OR IGNORE INTO data_versions (name) VALUES (?)', (table,))
+        for op in ('INSERT', 'UPDATE', 'DELETE'):
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version
+                        AFTER {op} ON {table} BEGIN
+                        UPDATE data_versions SET version = version + 1 WHERE name = '{table}';
+                        END''')
+
+
+def migrate_db(conn):
+    """Migrate database schema (inside init_db's transaction; any error rolls it all back)"""
     c = conn.cursor()
     
+    # Add password_salt column to users if missing (NULL marks a legacy SHA-256 hash)
+    if 'password_salt' not in table_columns(c, 'users'):
+        c.execute('ALTER TABLE users ADD COLUMN password_salt TEXT')
+    
     # Add kicking_order column if missing
-    try:
-        c.execute("PRAGMA table_info(game_player_status)")
-        columns = [row[1] for row in c.fetchall()]
-        if 'kicking_order' not in columns:
-            c.execute('ALTER TABLE game_player_status ADD COLUMN kicking_order INTEGER')
-            conn.commit()
-    except:
-        pass
+    if 'kicking_order' not in table_columns(c, 'game_player_status'):
+        c.execute('ALTER TABLE game_player_status ADD COLUMN kicking_order INTEGER')
     
     # Add is_female column to main_roster if missing
-    try:
-        c.execute("PRAGMA table_info(main_roster)")
-        columns = [row[1] for row in c.fetchall()]
-        if 'is_female' not in columns:
-            c.execute('ALTER TABLE main_roster ADD COLUMN is_female BOOLEAN DEFAULT 0')
-            conn.commit()
-    except:
-        pass
+    if 'is_female' not in table_columns(c, 'main_roster'):
+        c.execute('ALTER TABLE main_roster ADD COLUMN is_female BOOLEAN DEFAULT 0')
     
     # Add is_female column to substitutes if missing
-    try:
-        c.execute("PRAGMA table_info(substitutes)")
-        columns = [row[1] for row in c.fetchall()]
-        if 'is_female' not in columns:
-            c.execute('ALTER TABLE substitutes ADD COLUMN is_female BOOLEAN DEFAULT 0')
-            conn.commit()
-    except:
-        pass
-    
-    # Add team_logo column to games if missing
-    try:
-        c.execute("PRAGMA table_info(games)")
-        columns = [row[1] for row in c.fetchall()]
-        if 'team_logo' not in columns:
-            c.execute('ALTER TABLE games ADD COLUMN team_logo TEXT')
-            conn.commit()
-    except:
-        pass
-    
-    # Add is_published and published_at columns to games if missing
-    try:
-        c.execute("PRAGMA table_info(games)")
-        columns = [row[1] for row in c.fetchall()]
-        if 'is_published' not in columns:
-            c.execute('ALTER TABLE games ADD COLUMN is_published BOOLEAN DEFAULT 0')
-            conn.commit()
-        if 'published_at' not in columns:
-            c.execute('ALTER TABLE games ADD COLUMN published_at TIMESTAMP')
-            conn.commit()
-    except:
-        pass
+    if 'is_female' not in table_columns(c, 'substitutes'):
+        c.execute('ALTER TABLE substitutes ADD COLUMN is_female BOOLEAN DEFAULT 0')
+    
+    # Add team_logo, is_published and published_at columns to games if missing
+    columns = table_columns(c, 'games')
+    if 'team_logo' not in columns:
+        c.execute('ALTER TABLE games ADD COLUMN team_logo TEXT')
+    if 'is_published' not in columns:
+        c.execute('ALTER TABLE games ADD COLUMN is_published BOOLEAN DEFAULT 0')
+    if 'published_at' not in columns:
+        c.execute('ALTER TABLE games ADD COLUMN published_at TIMESTAMP')
+    
+    # Collapse duplicate lineup cells (keeping the latest) before they get a unique index
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_lp_cell'")
+    if c.fetchone() is None:
+        c.execute('''DELETE FROM lineup_positions WHERE id NOT IN (
+                        SELECT MAX(id) FROM lineup_positions GROUP BY game_id, inning, player_name)''')
+    
+    # Rebuild published snapshots from the old rowid layout as WITHOUT ROWID tables
+    for table, schema, columns in (
+            ('published_lineup', PUBLISHED_LINEUP_TABLE, 'game_id, inning, position, player_name'),
+            ('published_player_order', PUBLISHED_PLAYER_ORDER_TABLE, 'game_id, player_name, kicking_order')):
+        if 'id' in table_columns(c, table):
+            c.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+            c.execute(schema)
+            # The new primary key drops duplicate rows; newest first so, like the lineup
+            # cleanup above, the most recently written row is the one kept
+            c.execute(f'''INSERT OR IGNORE INTO {table} ({columns})
+                        SELECT {columns} FROM {table}_old WHERE player_name IS NOT NULL ORDER BY id DESC''')
+            c.execute(f'DROP TABLE {table}_old')
+
+
+def create_indexes(conn):
+    """Create indexes (after migrate_db, since some cover migrated columns)"""
+    c = conn.cursor()
     
+    # Indexes for the per-game lookups every lineup/status endpoint makes
+    # Matches get_lineup's ORDER BY so the kicking order is read straight off the index
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_gps_in_order
+                ON game_player_status(game_id, status, COALESCE(kicking_order, 999), player_name)''')
+    # Covers get_lineup's read in its ORDER BY; one position per player per inning is the
+    # conflict target for update_lineup_position's upsert
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_lp_game_inning_pos
+                ON lineup_positions(game_id, inning, position, player_name)''')
+    c.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_lp_cell ON lineup_positions(game_id, player_name, inning)')
+    
+    # Covering indexes for the public published-lineup reads and the genders lookup
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_pub_lineup_game
+                ON published_lineup(game_id, inning, position, player_name)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_pub_order_game
+                ON published_player_order(game_id, kicking_order, player_name)''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_main_roster_name ON main_roster(player_name, is_female)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_substitutes_name ON substitutes(player_name, is_female)')
+    
+    # Gather planner statistics for the indexes above; runs with the rest of the schema setup
+    c.execute('ANALYZE')
+
+
+def table_columns(c, table):
+    """Get the set of column names on a table"""
+    c.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in c.fetchall()}
+
+
+def column_exists(table, column):
+    """Check whether a table has the given column"""
+    conn = connect_db()
+    exists = column in table_columns(conn.cursor(), table)
     conn.close()
+    return exists
 
 
-def hash_password(password: str) -> str:
-    return hashlib.sha256(password.encode()).hexdigest()
+def hash_password(password: str, salt: bytes) -> str:
+    return hashlib.scrypt(password.encode(), salt=salt, n=16384, r=8, p=1, dklen=32).hex()
+
+
+def new_password_hash(password: str) -> tuple:
+    """Hash a password with a fresh salt, returning (password_hash, password_salt)"""
+    salt = os.urandom(16)
+    return hash_password(password, salt), salt.hex()
+
+
+def verify_password(password: str, password_hash: str, password_salt) -> bool:
+    if password_salt is None:
+        # Accounts created before salts were stored use unsalted SHA-256
+        candidate = hashlib.sha256(password.encode()).hexdigest()
+    else:
+        candidate = hash_password(password, bytes.fromhex(password_salt))
+    return hmac.compare_digest(candidate, password_hash)
+
+
+# username -> (expires_at, users row or None). Kept short-lived because other
+# worker processes can change users without invalidating this process's copy.
+USER_CACHE_TTL = 60
+USER_CACHE_MAX = 256
+_user_cache = {}
+
+
+def get_user_credentials(username):
+    """Look up id/password_hash/password_salt for a username, cached for USER_CACHE_TTL seconds"""
+    now = time.monotonic()
+    cached = _user_cache.get(username)
+    if cached and cached[0] > now:
+        return cached[1]
+    
+    c = get_db().cursor()
+    c.execute('SELECT id, password_hash, password_salt FROM users WHERE username = ?', (username,))
+    user = c.fetchone()
+    if len(_user_cache) >= USER_CACHE_MAX:
+        _user_cache.clear()
+    _user_cache[username] = (now + USER_CACHE_TTL, user)
+    return user
 
 
 def login_required(f):
@@ -228,17 +501,65 @@ def login_required(f):
     return decorated_function
 
 
+def versioned(*tables):
+    """Tag the response with the tables' change counters (plus the code version and the database's
+    token) and answer 304 while they are unchanged.
+    Recent bodies are kept per counters and view arguments, so the view only re-runs after a change."""
+    tables = tuple(sorted(tables))
+    names = (*tables, 'db_token')
+    placeholders = ', '.join('?' * len(names))
+    
+    def decorator(f):
+        # Keyed on the versions too, so bodies from before a change just age out
+        @lru_cache(maxsize=128)
+        def render(versions, args, kwargs):
+            return make_response(f(*args, **dict(kwargs))).get_data()
+        
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            c = get_db().cursor()
+            c.execute(f'SELECT version FROM data_versions WHERE name IN ({placeholders}) ORDER BY name', names)
+            versions = tuple(row[0] for row in c.fetchall())
+            etag = '-'.join((APP_VERSION, *tables, *map(str, versions)))
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=304)
+            else:
+                body = render(versions, args, tuple(sorted(kwargs.items())))
+                response = app.response_class(body, mimetype='application/json')
+            response.set_etag(etag, weak=True)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+
+# (monotonic deadline, value); the answer only changes at local midnight
+_next_thursday_cache = (0.0, None)
+
+
 def get_next_thursday() -> datetime:
+    global _next_thursday_cache
+    expires, cached = _next_thursday_cache
+    if time.monotonic() < expires:
+        return cached
+    
     today = datetime.now()
     days_until_thursday = (3 - today.weekday()) % 7
     if days_until_thursday == 0:
         days_until_thursday = 7
-    return today + timedelta(days=days_until_thursday)
+    result = today + timedelta(days=days_until_thursday)
+    
+    midnight = datetime.combine(today.date() + timedelta(days=1), datetime.min.time())
+    _next_thursday_cache = (time.monotonic() + (midnight - today).total_seconds(), result)
+    return result
 
 
 # Initialize database
 init_db()
 
+# The schema is fixed once migrations have run, so probe it only once
+HAS_PUBLISH_COLUMNS = column_exists('games', 'is_published')
+
 
 # ========== Static Routes ==========
 @app.route('/')
@@ -253,7 +574,8 @@ def serve_static(path):
 
 @app.route('/logos/<path:filename>')
 def serve_logo(filename):
-    return send_from_directory(LOGO_FOLDER, filename)
+    # Every upload gets a fresh random name, so a logo URL never changes content
+    return send_from_directory(LOGO_FOLDER, filename, max_age=LOGO_MAX_AGE)
 
 
 # ========== Auth Routes ==========
@@ -273,13 +595,16 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Username and password required'}), 400
     
-    conn = get_db()
-    c = conn.cursor()
-    c.execute('SELECT id, password_hash FROM users WHERE username = ?', (username,))
-    user = c.fetchone()
-    conn.close()
+    user = get_user_credentials(username)
     
-    if user and user['password_hash'] == hash_password(password):
+    if user and verify_password(password, user['password_hash'], user['password_salt']):
+        if user['password_salt'] is None:
+            # Upgrade legacy hash now that we have the plaintext
+            conn = get_db()
+            conn.execute('UPDATE users SET password_hash = ?, password_salt = ? WHERE id = ?',
+                         (*new_password_hash(password), user['id']))
+            conn.commit()
+            _user_cache.pop(username, None)
         session['user_id'] = user['id']
         session['username'] = username
         return jsonify({'success': True, 'username': username})
@@ -306,19 +631,17 @@ def register():
     c = conn.cursor()
     
     # Only allow registration if no users exist
-    c.execute('SELECT COUNT(*) as cnt FROM users')
-    if c.fetchone()['cnt'] > 0:
-        conn.close()
+    c.execute('SELECT EXISTS(SELECT 1 FROM users)')
+    if c.fetchone()[0]:
         return jsonify({'error': 'Users already exist'}), 400
     
     try:
-        c.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)',
-                  (username, hash_password(password)))
+        c.execute('INSERT INTO users (username, password_hash, password_salt) VALUES (?, ?, ?)',
+                  (username, *new_password_hash(password)))
         conn.commit()
-        conn.close()
+        _user_cache.pop(username, None)
         return jsonify({'success': True})
     except sqlite3.IntegrityError:
-        conn.close()
         return jsonify({'error': 'Username already exists'}), 400
 
 
@@ -326,10 +649,9 @@ def register():
 def has_users():
     conn = get_db()
     c = conn.cursor()
-    c.execute('SELECT COUNT(*) as cnt FROM users')
-    count = c.fetchone()['cnt']
-    conn.close()
-    return jsonify({'hasUsers': count > 0})
+    c.execute('SELECT EXISTS(SELECT 1 FROM users)')
+    exists = c.fetchone()[0]
+    return jsonify({'hasUsers': bool(exists)})
 
 
 @app.route('/api/auth/users', methods=['GET'])
@@ -340,7 +662,6 @@ def get_users():
     c = conn.cursor()
     c.execute('SELECT id, username FROM users ORDER BY username')
     users = [{'id': row['id'], 'username': row['username']} for row in c.fetchall()]
-    conn.close()
     return jsonify(users)
 
 
@@ -362,13 +683,12 @@ def create_user():
     c = conn.cursor()
     
     try:
-        c.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)',
-                  (username, hash_password(password)))
+        c.execute('INSERT INTO users (username, password_hash, password_salt) VALUES (?, ?, ?)',
+                  (username, *new_password_hash(password)))
         conn.commit()
-        conn.close()
+        _user_cache.pop(username, None)
         return jsonify({'success': True})
     except sqlite3.IntegrityError:
-        conn.close()
         return jsonify({'error': 'Username already exists'}), 400
 
 
@@ -383,18 +703,19 @@ def delete_user(user_id):
     c = conn.cursor()
     c.execute('DELETE FROM users WHERE id = ?', (user_id,))
     conn.commit()
-    conn.close()
+    _user_cache.clear()
     return jsonify({'success': True})
 
 
 # ========== Roster Routes ==========
 @app.route('/api/roster', methods=['GET'])
+@versioned('main_roster')
 def get_roster():
     conn = get_db()
     c = conn.cursor()
+    c.row_factory = None
     c.execute('SELECT player_name, is_female FROM main_roster ORDER BY player_name')
-    roster = [{'name': row['player_name'], 'isFemale': bool(row['is_female'])} for row in c.fetchall()]
-    conn.close()
+    roster = [{'name': name, 'isFemale': bool(is_female)} for name, is_female in c.fetchall()]
     return jsonify(roster)
 
 
@@ -414,10 +735,8 @@ def add_player():
         c.execute('INSERT INTO main_roster (player_name, is_female) VALUES (?, ?)',
                   (name, 1 if is_female else 0))
         conn.commit()
-        conn.close()
         return jsonify({'success': True})
     except sqlite3.IntegrityError:
-        conn.close()
         return jsonify({'error': 'Player already exists'}), 400
 
 
@@ -428,7 +747,6 @@ def delete_player(name):
     c = conn.cursor()
     c.execute('DELETE FROM main_roster WHERE player_name = ?', (name,))
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 
@@ -439,18 +757,18 @@ def toggle_player_gender(name):
     c = conn.cursor()
     c.execute('UPDATE main_roster SET is_female = NOT is_female WHERE player_name = ?', (name,))
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 
 # ========== Substitutes Routes ==========
 @app.route('/api/substitutes', methods=['GET'])
+@versioned('substitutes')
 def get_substitutes():
     conn = get_db()
     c = conn.cursor()
+    c.row_factory = None
     c.execute('SELECT player_name, is_female FROM substitutes ORDER BY player_name')
-    subs = [{'name': row['player_name'], 'isFemale': bool(row['is_female'])} for row in c.fetchall()]
-    conn.close()
+    subs = [{'name': name, 'isFemale': bool(is_female)} for name, is_female in c.fetchall()]
     return jsonify(subs)
 
 
@@ -470,10 +788,8 @@ def add_substitute():
         c.execute('INSERT INTO substitutes (player_name, is_female) VALUES (?, ?)',
                   (name, 1 if is_female else 0))
         conn.commit()
-        conn.close()
         return jsonify({'success': True})
     except sqlite3.IntegrityError:
-        conn.close()
         return jsonify({'error': 'Substitute already exists'}), 400
 
 
@@ -484,7 +800,6 @@ def delete_substitute(name):
     c = conn.cursor()
     c.execute('DELETE FROM substitutes WHERE player_name = ?', (name,))
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 
@@ -495,22 +810,17 @@ def toggle_substitute_gender(name):
     c = conn.cursor()
     c.execute('UPDATE substitutes SET is_female = NOT is_female WHERE player_name = ?', (name,))
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 
 # ========== Games Routes ==========
 @app.route('/api/games', methods=['GET'])
+@versioned('games')
 def get_games():
     conn = get_db()
     c = conn.cursor()
     
-    # Check if is_published column exists (for backward compatibility)
-    c.execute("PRAGMA table_info(games)")
-    columns = [row[1] for row in c.fetchall()]
-    has_publish_columns = 'is_published' in columns
-    
-    if has_publish_columns:
+    if HAS_PUBLISH_COLUMNS:
         c.execute('SELECT id, game_date, team_name, opponent_name, team_logo, is_published, published_at FROM games ORDER BY game_date DESC')
     else:
         c.execute('SELECT id, game_date, team_name, opponent_name, team_logo FROM games ORDER BY game_date DESC')
@@ -518,11 +828,10 @@ def get_games():
     games = []
     for row in c.fetchall():
         game = dict(row)
-        game['is_published'] = bool(game.get('is_published')) if has_publish_columns else False
-        if not has_publish_columns:
+        game['is_published'] = bool(game.get('is_published')) if HAS_PUBLISH_COLUMNS else False
+        if not HAS_PUBLISH_COLUMNS:
             game['published_at'] = None
         games.append(game)
-    conn.close()
     return jsonify(games)
 
 
@@ -532,14 +841,9 @@ def get_current_game():
     conn = get_db()
     c = conn.cursor()
     
-    # Check if is_published column exists
-    c.execute("PRAGMA table_info(games)")
-    columns = [row[1] for row in c.fetchall()]
-    has_publish_columns = 'is_published' in columns
-    
     next_thursday = get_next_thursday().date()
     
-    if has_publish_columns:
+    if HAS_PUBLISH_COLUMNS:
         c.execute('SELECT id, game_date, team_name, opponent_name, team_logo, is_published, published_at FROM games WHERE game_date = ?',
                   (next_thursday,))
     else:
@@ -550,16 +854,14 @@ def get_current_game():
     
     if not game:
         # Return null to indicate no game exists (don't auto-create)
-        conn.close()
         return jsonify({'exists': False, 'next_thursday': str(next_thursday)})
     
     game = dict(game)
     game['exists'] = True
-    game['is_published'] = bool(game.get('is_published')) if has_publish_columns else False
-    if not has_publish_columns:
+    game['is_published'] = bool(game.get('is_published')) if HAS_PUBLISH_COLUMNS else False
+    if not HAS_PUBLISH_COLUMNS:
         game['published_at'] = None
     
-    conn.close()
     return jsonify(game)
 
 
@@ -582,14 +884,12 @@ def create_game():
     c.execute('SELECT id FROM games WHERE game_date = ?', (game_date,))
     existing = c.fetchone()
     if existing:
-        conn.close()
         return jsonify({'error': 'A game already exists for this date'}), 400
     
     c.execute('INSERT INTO games (game_date, team_name, opponent_name, is_published) VALUES (?, ?, ?, 0)',
               (game_date, team_name, opponent_name))
     game_id = c.lastrowid
     conn.commit()
-    conn.close()
     
     return jsonify({
         'id': game_id,
@@ -610,25 +910,21 @@ def delete_game(game_id):
     conn = get_db()
     c = conn.cursor()
     
-    # Delete associated data
-    c.execute('DELETE FROM lineup_positions WHERE game_id = ?', (game_id,))
-    c.execute('DELETE FROM game_player_status WHERE game_id = ?', (game_id,))
-    c.execute('DELETE FROM published_lineup WHERE game_id = ?', (game_id,))
-    c.execute('DELETE FROM published_player_order WHERE game_id = ?', (game_id,))
+    c.execute('BEGIN IMMEDIATE')
     
-    # Delete the game's logo file if exists
-    c.execute('SELECT team_logo FROM games WHERE id = ?', (game_id,))
-    logo_row = c.fetchone()
-    if logo_row and logo_row['team_logo']:
-        logo_path = os.path.join(LOGO_FOLDER, logo_row['team_logo'])
-        if os.path.exists(logo_path):
-            os.remove(logo_path)
+    # Delete associated data (table names are constants, so formatting them in is safe)
+    for table in GAME_DATA_TABLES:
+        c.execute(f'DELETE FROM {table} WHERE game_id = ?', (game_id,))
     
-    # Delete the game
-    c.execute('DELETE FROM games WHERE id = ?', (game_id,))
+    # Delete the game, picking up its logo in the same statement
+    c.execute('DELETE FROM games WHERE id = ? RETURNING team_logo', (game_id,))
+    logo_row = c.fetchone()
     
     conn.commit()
-    conn.close()
+    
+    # Delete the game's logo file if exists, once the rows are gone
+    if logo_row and logo_row['team_logo']:
+        remove_logo_file(logo_row['team_logo'])
     
     return jsonify({'success': True})
 
@@ -638,23 +934,17 @@ def get_game(game_id):
     conn = get_db()
     c = conn.cursor()
     
-    # Check if is_published column exists
-    c.execute("PRAGMA table_info(games)")
-    columns = [row[1] for row in c.fetchall()]
-    has_publish_columns = 'is_published' in columns
-    
-    if has_publish_columns:
+    if HAS_PUBLISH_COLUMNS:
         c.execute('SELECT id, game_date, team_name, opponent_name, team_logo, is_published, published_at FROM games WHERE id = ?', (game_id,))
     else:
         c.execute('SELECT id, game_date, team_name, opponent_name, team_logo FROM games WHERE id = ?', (game_id,))
     
     game = c.fetchone()
-    conn.close()
     
     if game:
         game_dict = dict(game)
-        game_dict['is_published'] = bool(game_dict.get('is_published')) if has_publish_columns else False
-        if not has_publish_columns:
+        game_dict['is_published'] = bool(game_dict.get('is_published')) if HAS_PUBLISH_COLUMNS else False
+        if not HAS_PUBLISH_COLUMNS:
             game_dict['published_at'] = None
         return jsonify(game_dict)
     return jsonify({'error': 'Game not found'}), 404
@@ -670,43 +960,54 @@ def update_game(game_id):
                 updated_at = CURRENT_TIMESTAMP WHERE id = ?''',
               (data.get('game_date'), data.get('team_name'), data.get('opponent_name'), game_id))
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 
 @app.route('/api/games/<int:game_id>/logo', methods=['POST'])
 @login_required
 def upload_logo(game_id):
-    if 'logo' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['logo']
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+    """Save the game's logo, sent as the raw request body (original filename in ?filename=)
+    or as a multipart form with the file in 'logo'"""
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('logo')
+        if upload is None:
+            return jsonify({'error': 'No file provided'}), 400
+        if not upload.filename:
+            return jsonify({'error': 'No file selected'}), 400
+        original_name, source = upload.filename, upload.stream
+    else:
+        original_name, source = request.args.get('filename', ''), request.stream
+        if not original_name:
+            return jsonify({'error': 'No file provided'}), 400
+        if not request.content_length:
+            return jsonify({'error': 'No file selected'}), 400
     
-    if file and allowed_file(file.filename):
+    if allowed_file(original_name):
         # Generate unique filename
-        ext = file.filename.rsplit('.', 1)[1].lower()
+        ext = original_name.rsplit('.', 1)[1].lower()
         filename = f"game_{game_id}_{uuid.uuid4().hex[:8]}.{ext}"
         filepath = os.path.join(LOGO_FOLDER, filename)
         
-        # Delete old logo if exists
         conn = get_db()
         c = conn.cursor()
         c.execute('SELECT team_logo FROM games WHERE id = ?', (game_id,))
         old_logo = c.fetchone()
-        if old_logo and old_logo['team_logo']:
-            old_path = os.path.join(LOGO_FOLDER, old_logo['team_logo'])
-            if os.path.exists(old_path):
-                os.remove(old_path)
         
-        # Save new logo
-        file.save(filepath)
+        # Stream the upload straight to its final path
+        try:
+            with open(filepath, 'wb') as f:
+                shutil.copyfileobj(source, f, 64 * 1024)
+        except Exception:
+            Path(filepath).unlink(missing_ok=True)
+            raise
         
         # Update database
         c.execute('UPDATE games SET team_logo = ? WHERE id = ?', (filename, game_id))
         conn.commit()
-        conn.close()
+        
+        # Delete old logo once the new one is in place
+        if old_logo and old_logo['team_logo']:
+            remove_logo_file(old_logo['team_logo'])
         
         return jsonify({'success': True, 'logo': filename})
     
@@ -722,14 +1023,11 @@ def delete_logo(game_id):
     result = c.fetchone()
     
     if result and result['team_logo']:
-        filepath = os.path.join(LOGO_FOLDER, result['team_logo'])
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        remove_logo_file(result['team_logo'])
         
         c.execute('UPDATE games SET team_logo = NULL WHERE id = ?', (game_id,))
         conn.commit()
     
-    conn.close()
     return jsonify({'success': True})
 
 
@@ -738,29 +1036,33 @@ def delete_logo(game_id):
 def get_game_status(game_id):
     conn = get_db()
     c = conn.cursor()
+    c.row_factory = None
     
-    # Get main roster
-    c.execute('SELECT player_name, is_female FROM main_roster ORDER BY player_name')
-    main_roster = [{'name': row['player_name'], 'isFemale': bool(row['is_female'])} for row in c.fetchall()]
+    # Take the write lock up front so the reads and auto-inserts below share one transaction
+    c.execute('BEGIN IMMEDIATE')
     
-    # Get substitutes
-    c.execute('SELECT player_name, is_female FROM substitutes ORDER BY player_name')
-    substitutes = [{'name': row['player_name'], 'isFemale': bool(row['is_female'])} for row in c.fetchall()]
+    # Get main roster and substitutes in one query
+    c.execute('''SELECT 0 AS is_sub, player_name, is_female FROM main_roster
+                UNION ALL SELECT 1, player_name, is_female FROM substitutes
+                ORDER BY is_sub, player_name''')
+    main_roster = []
+    substitutes = []
+    for is_sub, name, is_female in c.fetchall():
+        (substitutes if is_sub else main_roster).append({'name': name, 'isFemale': bool(is_female)})
     
     # Get existing statuses
     c.execute('''SELECT player_name, status, is_substitute, kicking_order 
                 FROM game_player_status WHERE game_id = ?''', (game_id,))
-    existing_statuses = {row['player_name']: {'status': row['status'], 'isSub': bool(row['is_substitute']),
-                                               'kickingOrder': row['kicking_order']} for row in c.fetchall()}
+    existing_statuses = {name: {'status': status, 'isSub': bool(is_sub), 'kickingOrder': order}
+                         for name, status, is_sub, order in c.fetchall()}
     
     # Auto-initialize main roster players as IN if they don't have a status yet
     statuses = {}
-    max_order = 0
     
-    # Get current max kicking order
-    c.execute('SELECT COALESCE(MAX(kicking_order), 0) FROM game_player_status WHERE game_id = ?', (game_id,))
-    max_order = c.fetchone()[0] or 0
+    # Current max kicking order, from the statuses already fetched
+    max_order = max((s['kickingOrder'] or 0 for s in existing_statuses.values()), default=0)
     
+    rows_to_insert = []
     for player in main_roster:
         name = player['name']
         if name in existing_statuses:
@@ -768,10 +1070,13 @@ def get_game_status(game_id):
         else:
             # Auto-add main roster player as IN
             max_order += 1
-            c.execute('''INSERT INTO game_player_status (game_id, player_name, status, is_substitute, kicking_order)
-                        VALUES (?, ?, 'IN', 0, ?)''', (game_id, name, max_order))
+            rows_to_insert.append((game_id, name, max_order))
             statuses[name] = {'status': 'IN', 'isSub': False, 'kickingOrder': max_order}
     
+    if rows_to_insert:
+        c.executemany('''INSERT INTO game_player_status (game_id, player_name, status, is_substitute, kicking_order)
+                        VALUES (?, ?, 'IN', 0, ?)''', rows_to_insert)
+    
     # For substitutes, keep existing status or default to OUT (don't auto-add)
     for player in substitutes:
         name = player['name']
@@ -782,7 +1087,6 @@ def get_game_status(game_id):
             statuses[name] = {'status': 'OUT', 'isSub': True, 'kickingOrder': None}
     
     conn.commit()
-    conn.close()
     
     return jsonify({
         'mainRoster': main_roster,
@@ -797,78 +1101,55 @@ def toggle_player_status(game_id, player_name):
     conn = get_db()
     c = conn.cursor()
     
-    # Check if substitute
-    c.execute('SELECT COUNT(*) as cnt FROM substitutes WHERE player_name = ?', (player_name,))
-    is_sub = c.fetchone()['cnt'] > 0
+    # Hold the write lock from the status read through the write so concurrent toggles can't interleave
+    c.execute('BEGIN IMMEDIATE')
     
-    # Get current status
-    c.execute('SELECT status FROM game_player_status WHERE game_id = ? AND player_name = ?',
-              (game_id, player_name))
-    result = c.fetchone()
-    current_status = result['status'] if result else ('OUT' if is_sub else 'IN')
+    params = {'game_id': game_id, 'player_name': player_name}
     
-    if current_status == 'IN':
-        new_status = 'OUT'
-        kicking_order = None
-    else:
-        new_status = 'IN'
-        c.execute('SELECT COALESCE(MAX(kicking_order), 0) FROM game_player_status WHERE game_id = ? AND status = ?',
-                  (game_id, 'IN'))
-        max_order = c.fetchone()[0] or 0
-        kicking_order = max_order + 1
-    
-    c.execute('''INSERT OR REPLACE INTO game_player_status 
-               (game_id, player_name, status, is_substitute, kicking_order) VALUES (?, ?, ?, ?, ?)''',
-              (game_id, player_name, new_status, 1 if is_sub else 0, kicking_order))
+    # Check if substitute and get the current status in one lookup
+    c.execute('''SELECT EXISTS (SELECT 1 FROM substitutes WHERE player_name = :player_name),
+                (SELECT status FROM game_player_status WHERE game_id = :game_id AND player_name = :player_name)''',
+              params)
+    is_sub, current_status = c.fetchone()
+    if current_status is None:
+        current_status = 'OUT' if is_sub else 'IN'
+    new_status = 'OUT' if current_status == 'IN' else 'IN'
+    
+    c.execute(SET_PLAYER_STATUS, {**params, 'status': new_status, 'is_sub': is_sub})
     conn.commit()
-    conn.close()
     
     return jsonify({'success': True, 'newStatus': new_status})
 
 
 # ========== Lineup Routes ==========
 @app.route('/api/games/<int:game_id>/lineup', methods=['GET'])
+@versioned('game_player_status', 'lineup_positions', 'main_roster', 'substitutes')
 def get_lineup(game_id):
     conn = get_db()
     c = conn.cursor()
+    c.row_factory = None
     
     # Get available players in kicking order
     c.execute('''SELECT player_name, COALESCE(kicking_order, 999) as order_val 
                 FROM game_player_status 
                 WHERE game_id = ? AND status = 'IN' 
                 ORDER BY order_val, player_name''', (game_id,))
-    available_players = [row['player_name'] for row in c.fetchall()]
+    available_players = [name for name, _ in c.fetchall()]
     
     # Get player genders
-    c.execute('SELECT player_name, is_female FROM main_roster')
-    genders = {row['player_name']: bool(row['is_female']) for row in c.fetchall()}
-    c.execute('SELECT player_name, is_female FROM substitutes')
-    for row in c.fetchall():
-        genders[row['player_name']] = bool(row['is_female'])
+    c.execute('SELECT player_name, is_female FROM player_genders')
+    genders = {name: bool(is_female) for name, is_female in c.fetchall()}
     
-    # Get lineup positions
+    # Get lineup positions and sit-out counts
     c.execute('''SELECT inning, position, player_name FROM lineup_positions 
                 WHERE game_id = ? ORDER BY inning, position''', (game_id,))
-    lineup = {}
-    for row in c.fetchall():
-        inning = row['inning']
-        if inning not in lineup:
-            lineup[inning] = {}
-        lineup[inning][row['player_name']] = row['position']
+    lineup, sitOutCounts = group_lineup(c)
     
-    # Get sit-out counts
-    c.execute('''SELECT player_name, COUNT(*) as cnt FROM lineup_positions 
-                WHERE game_id = ? AND position = 'Out' GROUP BY player_name''', (game_id,))
-    sitOutCounts = {row['player_name']: row['cnt'] for row in c.fetchall()}
-    
-    conn.close()
-    return jsonify({
+    return lineup_response({
         'availablePlayers': available_players,
         'genders': genders,
         'lineup': lineup,
-        'sitOutCounts': sitOutCounts,
-        'positions': POSITIONS,
-        'abbreviations': POSITION_ABBREVIATIONS
+        'sitOutCounts': sitOutCounts
     })
 
 
@@ -881,18 +1162,42 @@ def update_lineup_position(game_id, player_name, inning):
     conn = get_db()
     c = conn.cursor()
     
-    # Delete old position for this player in this inning
-    c.execute('''DELETE FROM lineup_positions 
-               WHERE game_id = ? AND inning = ? AND player_name = ?''',
-              (game_id, inning, player_name))
+    # Set the player's position for this inning in place, or clear it
+    params = {'game_id': game_id, 'inning': inning, 'position': new_position, 'player': player_name}
+    c.execute(SET_LINEUP_POSITION if new_position else CLEAR_LINEUP_POSITION, params)
     
-    # Insert new position if not empty
-    if new_position:
-        c.execute('''INSERT INTO lineup_positions (game_id, inning, position, player_name) 
-                    VALUES (?, ?, ?, ?)''', (game_id, inning, new_position, player_name))
+    conn.commit()
+    return jsonify({'success': True})
+
+
+@app.route('/api/games/<int:game_id>/lineup', methods=['PUT'])
+@login_required
+def update_lineup_positions(game_id):
+    """Apply a batch of cell edits ({player, inning, position}) in one transaction"""
+    data = request.get_json(silent=True)
+    changes = data.get('changes') if isinstance(data, dict) else None
+    if not isinstance(changes, list):
+        return jsonify({'error': 'changes must be a list'}), 400
+    
+    # Reject the whole batch if any edit is malformed, before anything is written
+    if not all(valid_lineup_change(change) for change in changes):
+        return jsonify({'error': 'Invalid lineup change'}), 400
+    
+    # Keep the last edit per cell, then split into upserts and deletes
+    cells = {}
+    for change in changes:
+        cells[(change['player'], change['inning'])] = {
+            'game_id': game_id, 'inning': change['inning'],
+            'position': change.get('position') or '', 'player': change['player']}
+    to_set = [params for params in cells.values() if params['position']]
+    to_clear = [params for params in cells.values() if not params['position']]
     
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
+    c.executemany(CLEAR_LINEUP_POSITION, to_clear)
+    c.executemany(SET_LINEUP_POSITION, to_set)
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 
@@ -902,21 +1207,17 @@ def copy_inning(game_id):
     conn = get_db()
     c = conn.cursor()
     
-    # Get inning 1 positions
-    c.execute('SELECT position, player_name FROM lineup_positions WHERE game_id = ? AND inning = 1',
-              (game_id,))
-    first_inning = c.fetchall()
+    c.execute('BEGIN IMMEDIATE')
+    c.execute('DELETE FROM lineup_positions WHERE game_id = ? AND inning BETWEEN 2 AND 7', (game_id,))
     
-    # Copy to innings 2-7
-    for inning_num in range(2, 8):
-        c.execute('DELETE FROM lineup_positions WHERE game_id = ? AND inning = ?', (game_id, inning_num))
-        for row in first_inning:
-            if row['position']:
-                c.execute('INSERT INTO lineup_positions (game_id, inning, position, player_name) VALUES (?, ?, ?, ?)',
-                          (game_id, inning_num, row['position'], row['player_name']))
+    # Copy inning 1 positions to innings 2-7 inside SQLite
+    c.execute('''WITH innings(n) AS (VALUES (2), (3), (4), (5), (6), (7))
+                INSERT INTO lineup_positions (game_id, inning, position, player_name)
+                SELECT game_id, n, position, player_name FROM innings, lineup_positions
+                WHERE game_id = ? AND inning = 1 AND position != ''
+                ORDER BY n''', (game_id,))
     
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 
@@ -927,7 +1228,6 @@ def reset_lineup(game_id):
     c = conn.cursor()
     c.execute('DELETE FROM lineup_positions WHERE game_id = ?', (game_id,))
     conn.commit()
-    conn.close()
     return jsonify({'success': True})
 
 
@@ -940,65 +1240,63 @@ def update_player_order(game_id, player_name):
     conn = get_db()
     c = conn.cursor()
     
-    # Get current player's order
-    c.execute('SELECT kicking_order FROM game_player_status WHERE game_id = ? AND player_name = ?',
-              (game_id, player_name))
-    current_order = c.fetchone()['kicking_order']
+    # Hold the write lock from the lookup through the swap so concurrent moves can't both
+    # swap against the same stale orders
+    c.execute('BEGIN IMMEDIATE')
     
+    # Find the player above/below together with the current player's order
     if direction == 'up':
-        # Find player above
-        c.execute('''SELECT player_name, kicking_order FROM game_player_status 
-                    WHERE game_id = ? AND status = 'IN' AND kicking_order < ?
-                    ORDER BY kicking_order DESC LIMIT 1''', (game_id, current_order))
+        neighbour = 's.kicking_order < me.kicking_order ORDER BY s.kicking_order DESC'
     else:
-        # Find player below
-        c.execute('''SELECT player_name, kicking_order FROM game_player_status 
-                    WHERE game_id = ? AND status = 'IN' AND kicking_order > ?
-                    ORDER BY kicking_order ASC LIMIT 1''', (game_id, current_order))
+        neighbour = 's.kicking_order > me.kicking_order ORDER BY s.kicking_order ASC'
+    c.execute(f'''SELECT s.player_name, s.kicking_order, me.kicking_order
+                FROM game_player_status me JOIN game_player_status s
+                ON s.game_id = me.game_id AND s.status = 'IN'
+                WHERE me.game_id = ? AND me.player_name = ? AND {neighbour} LIMIT 1''',
+              (game_id, player_name))
     
     swap_player = c.fetchone()
+    swap_name = None
     if swap_player:
-        # Swap orders
-        c.execute('UPDATE game_player_status SET kicking_order = ? WHERE game_id = ? AND player_name = ?',
-                  (swap_player['kicking_order'], game_id, player_name))
-        c.execute('UPDATE game_player_status SET kicking_order = ? WHERE game_id = ? AND player_name = ?',
-                  (current_order, game_id, swap_player['player_name']))
-        conn.commit()
+        swap_name, swap_order, current_order = swap_player
+        # Swap orders in one statement
+        c.execute('''UPDATE game_player_status
+                    SET kicking_order = CASE player_name WHEN ? THEN ? WHEN ? THEN ? END
+                    WHERE game_id = ? AND player_name IN (?, ?)''',
+                  (player_name, swap_order, swap_name, current_order,
+                   game_id, player_name, swap_name))
+    conn.commit()
     
-    conn.close()
-    return jsonify({'success': True})
+    # Tell the client who moved so it can swap its copy without refetching the lineup
+    return jsonify({'success': True, 'swappedWith': swap_name})
 
 
 # ========== Publish Routes ==========
+def sync_published_snapshot(c, game_id):
+    """Bring a game's published snapshot in line with its current lineup and order"""
+    params = {'game_id': game_id}
+    for sql in SYNC_PUBLISHED_LINEUP:
+        c.execute(sql, params)
+
+
 @app.route('/api/games/<int:game_id>/publish', methods=['POST'])
 @login_required
 def publish_lineup(game_id):
     """Publish the current lineup, making it visible to the public"""
     conn = get_db()
     c = conn.cursor()
+    c.execute('BEGIN IMMEDIATE')
     
-    # Clear existing published data for this game
-    c.execute('DELETE FROM published_lineup WHERE game_id = ?', (game_id,))
-    c.execute('DELETE FROM published_player_order WHERE game_id = ?', (game_id,))
+    sync_published_snapshot(c, game_id)
     
-    # Copy current lineup to published
-    c.execute('''INSERT INTO published_lineup (game_id, inning, position, player_name)
-                SELECT game_id, inning, position, player_name FROM lineup_positions WHERE game_id = ?''',
-              (game_id,))
-    
-    # Copy current player order to published
-    c.execute('''INSERT INTO published_player_order (game_id, player_name, kicking_order)
-                SELECT game_id, player_name, kicking_order FROM game_player_status 
-                WHERE game_id = ? AND status = 'IN' ''', (game_id,))
-    
-    # Mark game as published
-    c.execute('''UPDATE games SET is_published = 1, published_at = CURRENT_TIMESTAMP WHERE id = ?''',
-              (game_id,))
+    # Mark game as published, reading back the timestamp it was stamped with
+    c.execute('''UPDATE games SET is_published = 1, published_at = CURRENT_TIMESTAMP WHERE id = ?
+                RETURNING published_at''', (game_id,))
+    row = c.fetchone()
     
     conn.commit()
-    conn.close()
     
-    return jsonify({'success': True, 'published': True})
+    return jsonify({'success': True, 'published': True, 'published_at': row['published_at'] if row else None})
 
 
 @app.route('/api/games/<int:game_id>/unpublish', methods=['POST'])
@@ -1008,86 +1306,85 @@ def unpublish_lineup(game_id):
     conn = get_db()
     c = conn.cursor()
     
-    # Clear published data
-    c.execute('DELETE FROM published_lineup WHERE game_id = ?', (game_id,))
-    c.execute('DELETE FROM published_player_order WHERE game_id = ?', (game_id,))
+    # The snapshot rows are left in place: readers check is_published first, and
+    # the next publish_lineup syncs them against the current lineup anyway
     
     # Mark game as unpublished
     c.execute('''UPDATE games SET is_published = 0, published_at = NULL WHERE id = ?''', (game_id,))
     
     conn.commit()
-    conn.close()
     
     return jsonify({'success': True, 'published': False})
 
 
+# What the public view gets for a game that isn't published; it never changes
+UNPUBLISHED_LINEUP_BODY = lineup_body({
+    'published': False,
+    'availablePlayers': [],
+    'genders': {},
+    'lineup': {},
+    'sitOutCounts': {}
+})
+
+
+@lru_cache(maxsize=128)
+def published_lineup_body(game_id, versions):
+    """Serialized published lineup for a game, cached per set of data versions"""
+    c = get_db().cursor()
+    c.row_factory = None
+    
+    # Get published player order with the genders of just those players
+    # (a substitute wins over a roster player with the same name)
+    c.execute('''SELECT po.player_name,
+                    CASE WHEN s.player_name IS NOT NULL THEN s.is_female ELSE m.is_female END,
+                    s.player_name IS NOT NULL OR m.player_name IS NOT NULL
+                FROM published_player_order po
+                LEFT JOIN substitutes s ON s.player_name = po.player_name
+                LEFT JOIN main_roster m ON m.player_name = po.player_name
+                WHERE po.game_id = ? ORDER BY po.kicking_order, po.player_name''', (game_id,))
+    available_players = []
+    genders = {}
+    for name, is_female, known in c:
+        available_players.append(name)
+        if known:
+            genders[name] = bool(is_female)
+    
+    # Get published lineup positions and sit-out counts
+    c.execute('''SELECT inning, position, player_name FROM published_lineup 
+                WHERE game_id = ? ORDER BY inning, position''', (game_id,))
+    lineup, sitOutCounts = group_lineup(c)
+    
+    return lineup_body({
+        'published': True,
+        'availablePlayers': available_players,
+        'genders': genders,
+        'lineup': lineup,
+        'sitOutCounts': sitOutCounts
+    })
+
+
 @app.route('/api/games/<int:game_id>/lineup/published', methods=['GET'])
 def get_published_lineup(game_id):
     """Get the published lineup for public viewing"""
     conn = get_db()
     c = conn.cursor()
     
-    # Check if is_published column exists
-    c.execute("PRAGMA table_info(games)")
-    columns = [row[1] for row in c.fetchall()]
-    has_publish_columns = 'is_published' in columns
-    
     # Check if game is published
     is_published = False
-    if has_publish_columns:
+    if HAS_PUBLISH_COLUMNS:
         c.execute('SELECT is_published FROM games WHERE id = ?', (game_id,))
         game = c.fetchone()
         is_published = game and bool(game['is_published'])
     
     if not is_published:
-        conn.close()
-        return jsonify({
-            'published': False,
-            'availablePlayers': [],
-            'genders': {},
-            'lineup': {},
-            'sitOutCounts': {},
-            'positions': POSITIONS,
-            'abbreviations': POSITION_ABBREVIATIONS
-        })
-    
-    # Get published player order
-    c.execute('''SELECT player_name, kicking_order FROM published_player_order 
-                WHERE game_id = ? ORDER BY kicking_order, player_name''', (game_id,))
-    available_players = [row['player_name'] for row in c.fetchall()]
-    
-    # Get player genders
-    c.execute('SELECT player_name, is_female FROM main_roster')
-    genders = {row['player_name']: bool(row['is_female']) for row in c.fetchall()}
-    c.execute('SELECT player_name, is_female FROM substitutes')
-    for row in c.fetchall():
-        genders[row['player_name']] = bool(row['is_female'])
-    
-    # Get published lineup positions
-    c.execute('''SELECT inning, position, player_name FROM published_lineup 
-                WHERE game_id = ? ORDER BY inning, position''', (game_id,))
-    lineup = {}
-    for row in c.fetchall():
-        inning = row['inning']
-        if inning not in lineup:
-            lineup[inning] = {}
-        lineup[inning][row['player_name']] = row['position']
-    
-    # Get sit-out counts from published lineup
-    c.execute('''SELECT player_name, COUNT(*) as cnt FROM published_lineup 
-                WHERE game_id = ? AND position = 'Out' GROUP BY player_name''', (game_id,))
-    sitOutCounts = {row['player_name']: row['cnt'] for row in c.fetchall()}
-    
-    conn.close()
-    return jsonify({
-        'published': True,
-        'availablePlayers': available_players,
-        'genders': genders,
-        'lineup': lineup,
-        'sitOutCounts': sitOutCounts,
-        'positions': POSITIONS,
-        'abbreviations': POSITION_ABBREVIATIONS
-    })
+        return app.response_class(UNPUBLISHED_LINEUP_BODY, mimetype='application/json')
+    
+    # Snapshots only change when a game is (re)published, which bumps the games counter,
+    # and genders come from the roster tables, so these counters key the cached body
+    c.execute('''SELECT version FROM data_versions
+                WHERE name IN ('games', 'main_roster', 'substitutes') ORDER BY name''')
+    versions = tuple(row[0] for row in c)
+    return app.response_class(published_lineup_body(game_id, versions), mimetype='application/json')
 
 
 if __name__ == '__main__':
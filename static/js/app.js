@@ -19,7 +19,12 @@ const state = {
     genders: {},
     sitOutCounts: {},
     positions: [],
-    abbreviations: {}
+    abbreviations: {},
+    lineupReload: null,
+    lineupReloadQueued: false,
+    pendingPositions: new Map(),
+    positionFlush: null,
+    statusToggles: {}
 };
 
 // ========================================
@@ -221,11 +226,15 @@ async function loadGameLineup() {
     panel.innerHTML = '<div class="loading"><div class="spinner"></div></div>';
     
     try {
-        // Load all games for the selector
-        state.allGames = await api('/api/games');
+        // Let queued position edits for the previous game land before switching
+        await state.positionFlush?.catch(() => {});
         
-        // Load current game (no longer auto-creates)
-        const gameResponse = await api('/api/games/current');
+        // Load all games for the selector and the current game (no longer auto-creates) together
+        const [allGames, gameResponse] = await Promise.all([
+            api('/api/games'),
+            api('/api/games/current')
+        ]);
+        state.allGames = allGames;
         
         // Check if a game exists for this week
         if (!gameResponse.exists) {
@@ -365,11 +374,16 @@ async function loadGameById(gameId) {
     panel.innerHTML = '<div class="loading"><div class="spinner"></div></div>';
     
     try {
-        // Refresh all games list
-        state.allGames = await api('/api/games');
+        // Let queued position edits for the previous game land before switching
+        await state.positionFlush?.catch(() => {});
         
-        // Load specific game
-        state.currentGame = await api(`/api/games/${gameId}`);
+        // Refresh all games list and load the specific game together
+        const [allGames, game] = await Promise.all([
+            api('/api/games'),
+            api(`/api/games/${gameId}`)
+        ]);
+        state.allGames = allGames;
+        state.currentGame = game;
         
         // Load game status (players and their IN/OUT status)
         const statusData = await api(`/api/games/${state.currentGame.id}/status`);
@@ -579,8 +593,12 @@ function buildLineupTable() {
                 <th style="width: 60px;">↑↓</th>
     `;
     
+    // Summarize each inning once; the cells below reuse its duplicate set
+    const playingPositions = state.positions.filter(p => p !== 'Out');
+    const inningSummaries = [];
     for (let i = 1; i <= 7; i++) {
-        const warnings = getInningWarnings(i);
+        inningSummaries[i] = getInningSummary(i, playingPositions);
+        const warnings = inningSummaries[i].warnings;
         const warningIcon = warnings.length > 0 
             ? `<span class="inning-warning" title="${escapeHtml(warnings.join(' | '))}">⚠️</span>` 
             : '';
@@ -589,6 +607,14 @@ function buildLineupTable() {
     
     headerHtml += `<th>Out</th></tr></thead>`;
     
+    // Every cell's options only differ in which one is selected, so build each variant once
+    const optionsHtml = {};
+    const positionOptions = (selected) => optionsHtml[selected] ??= state.positions.map(pos => `
+                            <option value="${pos}" ${selected === pos ? 'selected' : ''}>
+                                ${state.abbreviations[pos] || pos}
+                            </option>
+                        `).join('');
+    
     // Build body
     let bodyHtml = '<tbody>';
     
@@ -619,7 +645,7 @@ function buildLineupTable() {
             const position = state.lineup[inning]?.[player] || '';
             const abbrev = position ? state.abbreviations[position] || position : '';
             const isOut = position === 'Out';
-            const isDuplicate = checkDuplicatePosition(inning, position, player);
+            const isDuplicate = inningSummaries[inning].duplicates.has(position);
             
             bodyHtml += `
                 <td>
@@ -627,11 +653,7 @@ function buildLineupTable() {
                             onchange="updatePosition('${escapeHtml(player)}', ${inning}, this.value)"
                             ${isDuplicate ? `title="Duplicate position!"` : ''}>
                         <option value="">-</option>
-                        ${state.positions.map(pos => `
-                            <option value="${pos}" ${position === pos ? 'selected' : ''}>
-                                ${state.abbreviations[pos] || pos}
-                            </option>
-                        `).join('')}
+                        ${positionOptions(position)}
                     </select>
                 </td>
             `;
@@ -648,7 +670,7 @@ function buildLineupTable() {
     return `<table class="lineup-table">${headerHtml}${bodyHtml}</table>`;
 }
 
-function getInningWarnings(inning) {
+function getInningSummary(inning, playingPositions) {
     const warnings = [];
     
     // Count females on field
@@ -679,7 +701,6 @@ function getInningWarnings(inning) {
     }
     
     // Check for unused positions
-    const playingPositions = state.positions.filter(p => p !== 'Out');
     const unused = playingPositions.filter(p => !positionsUsed.has(p));
     if (unused.length > 0 && positionsUsed.size > 0) {
         const unusedAbbrevs = unused.slice(0, 3).map(p => state.abbreviations[p] || p);
@@ -689,54 +710,88 @@ function getInningWarnings(inning) {
         warnings.push(`Unused: ${unusedAbbrevs.join(', ')}`);
     }
     
-    return warnings;
+    return { warnings, duplicates };
 }
 
-function checkDuplicatePosition(inning, position, currentPlayer) {
-    if (!position || position === 'Out' || position === '') return false;
+async function togglePlayerStatus(playerName) {
+    // Flip the button right away; the server's answer confirms or corrects it
+    const isSub = state.substitutes.some(p => p.name === playerName);
+    const previousStatus = state.playerStatuses[playerName]?.status || (isSub ? 'OUT' : 'IN');
+    const toggle = state.statusToggles[playerName] = (state.statusToggles[playerName] || 0) + 1;
+    setPlayerStatus(playerName, previousStatus === 'IN' ? 'OUT' : 'IN');
     
-    for (const player of state.availablePlayers) {
-        if (player !== currentPlayer && state.lineup[inning]?.[player] === position) {
-            return true;
+    let result;
+    try {
+        result = await api(`/api/games/${state.currentGame.id}/status/${encodeURIComponent(playerName)}`, {
+            method: 'PUT'
+        });
+    } catch (error) {
+        console.error('Failed to toggle player status:', error);
+        if (state.statusToggles[playerName] === toggle) {
+            setPlayerStatus(playerName, previousStatus);
         }
+        return;
+    }
+    
+    // A later click on the same player has already flipped it again
+    if (state.statusToggles[playerName] === toggle) {
+        setPlayerStatus(playerName, result.newStatus);
     }
     
-    return false;
+    // Reload just the lineup data (available players list may have changed); the toggle
+    // itself was saved, so a failed reload leaves the button alone
+    try {
+        await reloadLineup();
+    } catch (error) {
+        console.error('Failed to reload lineup:', error);
+    }
 }
 
-async function togglePlayerStatus(playerName) {
-    try {
-        const result = await api(`/api/games/${state.currentGame.id}/status/${encodeURIComponent(playerName)}`, {
-            method: 'PUT'
-        });
-        
-        // Update local state
-        if (!state.playerStatuses[playerName]) {
-            state.playerStatuses[playerName] = {};
+function setPlayerStatus(playerName, status) {
+    // Update local state
+    if (!state.playerStatuses[playerName]) {
+        state.playerStatuses[playerName] = {};
+    }
+    state.playerStatuses[playerName].status = status;
+    
+    // Update just the player's button (no full page refresh)
+    const buttons = document.querySelectorAll('.player-toggle');
+    buttons.forEach(btn => {
+        if (btn.textContent.trim().replace(' ♀', '') === playerName) {
+            btn.classList.remove('status-in', 'status-out');
+            btn.classList.add(`status-${status.toLowerCase()}`);
         }
-        state.playerStatuses[playerName].status = result.newStatus;
-        
-        // Update just the button that was clicked (no full page refresh)
-        const buttons = document.querySelectorAll('.player-toggle');
-        buttons.forEach(btn => {
-            if (btn.textContent.trim().replace(' ♀', '') === playerName) {
-                btn.classList.remove('status-in', 'status-out');
-                btn.classList.add(`status-${result.newStatus.toLowerCase()}`);
-            }
-        });
-        
-        // Reload just the lineup data (available players list may have changed)
-        const lineupData = await api(`/api/games/${state.currentGame.id}/lineup`);
-        state.availablePlayers = lineupData.availablePlayers;
-        state.genders = lineupData.genders;
-        state.lineup = lineupData.lineup;
-        state.sitOutCounts = lineupData.sitOutCounts;
-        
-        // Re-render just the lineup table
-        updateLineupTable();
-    } catch (error) {
-        console.error('Failed to toggle player status:', error);
+    });
+}
+
+function reloadLineup() {
+    // Coalesce bursts of toggles: while a reload is in flight, further calls just
+    // queue one more fetch behind it instead of each fetching and re-rendering
+    if (state.lineupReload) {
+        state.lineupReloadQueued = true;
+        return state.lineupReload;
     }
+    
+    state.lineupReload = (async () => {
+        try {
+            do {
+                state.lineupReloadQueued = false;
+                // Let queued position edits land first so the fetch reflects them
+                await state.positionFlush?.catch(() => {});
+                const lineupData = await api(`/api/games/${state.currentGame.id}/lineup`);
+                state.availablePlayers = lineupData.availablePlayers;
+                state.genders = lineupData.genders;
+                state.lineup = lineupData.lineup;
+                state.sitOutCounts = lineupData.sitOutCounts;
+            } while (state.lineupReloadQueued);
+            
+            // Re-render just the lineup table
+            updateLineupTable();
+        } finally {
+            state.lineupReload = null;
+        }
+    })();
+    return state.lineupReload;
 }
 
 function updateLineupTable() {
@@ -789,56 +844,101 @@ async function deleteGame() {
 }
 
 async function updatePosition(player, inning, position) {
+    // Store the old position to calculate sit-out count change
+    const oldPosition = state.lineup[inning]?.[player] || '';
+    
+    // Update local state
+    if (!state.lineup[inning]) {
+        state.lineup[inning] = {};
+    }
+    
+    if (position) {
+        state.lineup[inning][player] = position;
+    } else {
+        delete state.lineup[inning][player];
+    }
+    
+    // Update sit-out counts properly
+    // Decrement if moving FROM "Out"
+    if (oldPosition === 'Out' && position !== 'Out') {
+        state.sitOutCounts[player] = Math.max(0, (state.sitOutCounts[player] || 0) - 1);
+    }
+    // Increment if moving TO "Out"
+    if (position === 'Out' && oldPosition !== 'Out') {
+        state.sitOutCounts[player] = (state.sitOutCounts[player] || 0) + 1;
+    }
+    
+    // Re-render just the lineup table to update warnings and counts
+    updateLineupTable();
+    
+    // Queue the edit under the game it was made in; later edits to the same cell
+    // replace it before it is sent
+    const gameId = state.currentGame.id;
+    state.pendingPositions.set(`${gameId}:${inning}:${player}`, { gameId, player, inning, position });
     try {
-        // Store the old position to calculate sit-out count change
-        const oldPosition = state.lineup[inning]?.[player] || '';
-        
-        await api(`/api/games/${state.currentGame.id}/lineup/${encodeURIComponent(player)}/${inning}`, {
-            method: 'PUT',
-            body: JSON.stringify({ position })
-        });
-        
-        // Update local state
-        if (!state.lineup[inning]) {
-            state.lineup[inning] = {};
-        }
-        
-        if (position) {
-            state.lineup[inning][player] = position;
-        } else {
-            delete state.lineup[inning][player];
-        }
-        
-        // Update sit-out counts properly
-        // Decrement if moving FROM "Out"
-        if (oldPosition === 'Out' && position !== 'Out') {
-            state.sitOutCounts[player] = Math.max(0, (state.sitOutCounts[player] || 0) - 1);
-        }
-        // Increment if moving TO "Out"
-        if (position === 'Out' && oldPosition !== 'Out') {
-            state.sitOutCounts[player] = (state.sitOutCounts[player] || 0) + 1;
-        }
-        
-        // Re-render just the lineup table to update warnings and counts
-        updateLineupTable();
+        await flushPositions();
     } catch (error) {
         console.error('Failed to update position:', error);
+        // Resync with what the server actually saved
+        await reloadLineup();
     }
 }
 
+function flushPositions() {
+    // One batch in flight at a time: edits made while it is saving go out
+    // together in the next request, which the server applies in one transaction
+    if (state.positionFlush) {
+        return state.positionFlush;
+    }
+    
+    state.positionFlush = (async () => {
+        try {
+            while (state.pendingPositions.size > 0) {
+                // Group the queued edits by the game each was made in
+                const changesByGame = new Map();
+                for (const { gameId, ...change } of state.pendingPositions.values()) {
+                    if (!changesByGame.has(gameId)) {
+                        changesByGame.set(gameId, []);
+                    }
+                    changesByGame.get(gameId).push(change);
+                }
+                state.pendingPositions.clear();
+                
+                for (const [gameId, changes] of changesByGame) {
+                    await api(`/api/games/${gameId}/lineup`, {
+                        method: 'PUT',
+                        body: JSON.stringify({ changes })
+                    });
+                }
+            }
+        } catch (error) {
+            state.pendingPositions.clear();
+            throw error;
+        } finally {
+            state.positionFlush = null;
+        }
+    })();
+    return state.positionFlush;
+}
+
 async function movePlayer(player, direction) {
     try {
-        await api(`/api/games/${state.currentGame.id}/order/${encodeURIComponent(player)}`, {
+        const result = await api(`/api/games/${state.currentGame.id}/order/${encodeURIComponent(player)}`, {
             method: 'PUT',
             body: JSON.stringify({ direction })
         });
-        
-        // Reload just the lineup data (not the entire page)
-        const lineupData = await api(`/api/games/${state.currentGame.id}/lineup`);
-        state.availablePlayers = lineupData.availablePlayers;
-        state.genders = lineupData.genders;
-        state.lineup = lineupData.lineup;
-        state.sitOutCounts = lineupData.sitOutCounts;
+        if (!result.swappedWith) return;
+        
+        // Apply the same swap to local state instead of reloading the lineup, but only
+        // if the server swapped with the neighbour shown here; otherwise resync
+        const players = state.availablePlayers;
+        const from = players.indexOf(player);
+        const to = from + (direction === 'up' ? -1 : 1);
+        if (from === -1 || players[to] !== result.swappedWith) {
+            await reloadLineup();
+            return;
+        }
+        [players[from], players[to]] = [players[to], players[from]];
         
         // Re-render just the lineup table
         updateLineupTable();
@@ -852,14 +952,7 @@ async function copyInning() {
         await api(`/api/games/${state.currentGame.id}/lineup/copy`, { method: 'POST' });
         
         // Reload just the lineup data (not the entire page)
-        const lineupData = await api(`/api/games/${state.currentGame.id}/lineup`);
-        state.availablePlayers = lineupData.availablePlayers;
-        state.genders = lineupData.genders;
-        state.lineup = lineupData.lineup;
-        state.sitOutCounts = lineupData.sitOutCounts;
-        
-        // Re-render just the lineup table
-        updateLineupTable();
+        await reloadLineup();
     } catch (error) {
         console.error('Failed to copy inning:', error);
     }
@@ -872,14 +965,7 @@ async function resetLineup() {
         await api(`/api/games/${state.currentGame.id}/lineup/reset`, { method: 'POST' });
         
         // Reload just the lineup data (not the entire page)
-        const lineupData = await api(`/api/games/${state.currentGame.id}/lineup`);
-        state.availablePlayers = lineupData.availablePlayers;
-        state.genders = lineupData.genders;
-        state.lineup = lineupData.lineup;
-        state.sitOutCounts = lineupData.sitOutCounts;
-        
-        // Re-render just the lineup table
-        updateLineupTable();
+        await reloadLineup();
     } catch (error) {
         console.error('Failed to reset lineup:', error);
     }
@@ -889,13 +975,12 @@ async function uploadLogo(input) {
     const file = input.files[0];
     if (!file) return;
     
-    const formData = new FormData();
-    formData.append('logo', file);
-    
     try {
-        const response = await fetch(`/api/games/${state.currentGame.id}/logo`, {
+        // Send the file as the raw request body so the server can stream it to disk
+        const response = await fetch(`/api/games/${state.currentGame.id}/logo?filename=${encodeURIComponent(file.name)}`, {
             method: 'POST',
-            body: formData
+            headers: { 'Content-Type': file.type || 'application/octet-stream' },
+            body: file
         });
         
         const data = await response.json();
@@ -978,9 +1063,11 @@ async function loadRoster() {
     panel.innerHTML = '<div class="loading"><div class="spinner"></div></div>';
     
     try {
-        const roster = await api('/api/roster');
-        const substitutes = await api('/api/substitutes');
-        const users = await api('/api/auth/users');
+        const [roster, substitutes, users] = await Promise.all([
+            api('/api/roster'),
+            api('/api/substitutes'),
+            api('/api/auth/users')
+        ]);
         
         renderRoster(roster, substitutes, users);
     } catch (error) {
@@ -999,9 +1086,11 @@ async function refreshRosterData() {
     const panelScrollTop = panel ? panel.scrollTop : 0;
     
     try {
-        const roster = await api('/api/roster');
-        const substitutes = await api('/api/substitutes');
-        const users = await api('/api/auth/users');
+        const [roster, substitutes, users] = await Promise.all([
+            api('/api/roster'),
+            api('/api/substitutes'),
+            api('/api/auth/users')
+        ]);
         
         renderRoster(roster, substitutes, users);
         
@@ -1310,22 +1399,24 @@ async function loadViewLineup() {
     }
 }
 
-async function renderViewLineup(gameId, selectedPlayer = null) {
+async function renderViewLineup(gameId, selectedPlayer = null, lineupData = null) {
     const panel = document.getElementById('viewLineupPanel');
     
     // Find the game
     const game = state.games.find(g => g.id === gameId);
     if (!game) return;
     
-    // Get published lineup data (for public view) or regular lineup (for authenticated users)
-    let lineupData;
-    if (state.authenticated) {
-        // Authenticated users can see unpublished lineups
-        lineupData = await api(`/api/games/${gameId}/lineup`);
-        lineupData.published = true; // Mark as viewable
-    } else {
-        // Public view only shows published lineups
-        lineupData = await api(`/api/games/${gameId}/lineup/published`);
+    // Get published lineup data (for public view) or regular lineup (for authenticated users),
+    // unless the caller is re-rendering data it already has
+    if (!lineupData) {
+        if (state.authenticated) {
+            // Authenticated users can see unpublished lineups
+            lineupData = await api(`/api/games/${gameId}/lineup`);
+            lineupData.published = true; // Mark as viewable
+        } else {
+            // Public view only shows published lineups
+            lineupData = await api(`/api/games/${gameId}/lineup/published`);
+        }
     }
     
     // Store for player filter
@@ -1520,7 +1611,8 @@ async function changeViewGame(gameId) {
 
 function filterByPlayer(playerName) {
     if (state.currentViewGameId) {
-        renderViewLineup(state.currentViewGameId, playerName || null);
+        // Filtering only changes the presentation, so re-render the lineup already fetched
+        renderViewLineup(state.currentViewGameId, playerName || null, state.currentViewLineup);
     }
 }
 